@@ -7,11 +7,15 @@ import sys
 import logging
 import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("setup")
 
+# Maximum number of packages downloaded by pip at the same time
+PIP_WORKERS = 8
+
 def check_dependencies():
     """Check if all required dependencies are installed"""
     logger.info("Checking dependencies...")
@@ -33,6 +37,10 @@ def check_dependencies():
     
     return True
 
+def pip_install(*args):
+    """Run pip install with the given arguments"""
+    subprocess.check_call([sys.executable, "-m", "pip", "install", *args])
+
 def install_requirements():
     """Install required packages"""
     logger.info("Installing requirements...")
@@ -42,8 +50,25 @@ def install_requirements():
         logger.error("requirements.txt not found")
         return False
     
+    requirements = [line.strip() for line in req_path.read_text().splitlines()
+                    if line.strip() and not line.strip().startswith("#")]
+    
+    # Upgrade pip on its own first, it must not race with the parallel installs
+    try:
+        pip_install("--upgrade", "pip")
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"Failed to upgrade pip: {e}")
+    
+    # Fetch packages concurrently, dependencies are resolved by the final pass
+    if requirements:
+        try:
+            with ThreadPoolExecutor(max_workers=min(PIP_WORKERS, len(requirements))) as executor:
+                list(executor.map(lambda requirement: pip_install("--no-deps", requirement), requirements))
+        except Exception as e:
+            logger.warning(f"Parallel install failed ({e}), falling back to a serial install")
+    
     try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", str(req_path)])
+        pip_install("-r", str(req_path))
         logger.info("Requirements installed successfully")
         return True
     except subprocess.CalledProcessError as e:
@@ -114,6 +139,15 @@ WantedBy=multi-user.target
     
     return True
 
+def run_step(step):
+    """Run a single (name, function, skip) setup step, returning its success"""
+    step_name, step_func, _ = step
+    logger.info(f"Running: {step_name}")
+    success = step_func()
+    if not success:
+        logger.error(f"Step failed: {step_name}")
+    return success
+
 def main():
     """Main setup function"""
     parser = argparse.ArgumentParser(description="Rune setup script")
@@ -135,18 +169,18 @@ def main():
         ("Setting up autostart", setup_autostart, args.skip_autostart)
     ]
     
-    all_success = True
-    for step_name, step_func, skip in steps:
+    for step_name, _, skip in steps:
         if skip:
             logger.info(f"Skipping: {step_name}")
-            continue
-        
-        logger.info(f"Running: {step_name}")
-        success = step_func()
-        if not success:
-            logger.error(f"Step failed: {step_name}")
-            all_success = False
-            break
+    
+    # Requirements must be in place first, the remaining steps are independent
+    serial_steps = [step for step in steps[:2] if not step[2]]
+    parallel_steps = [step for step in steps[2:] if not step[2]]
+    
+    all_success = all(run_step(step) for step in serial_steps)
+    if all_success and parallel_steps:
+        with ThreadPoolExecutor(max_workers=len(parallel_steps)) as executor:
+            all_success = all(list(executor.map(run_step, parallel_steps)))
     
     if all_success:
         logger.info("Setup completed successfully!")
@@ -1,8 +1,17 @@
 """
 AI Assistant engine for Rune
 """
+import asyncio
+import datetime
+import gc
 import logging
 import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
 from pathlib import Path
 
 try:
@@ -12,14 +21,127 @@ except ImportError:
     CTRANSFORMERS_AVAILABLE = False
     logging.warning("ctransformers library not found. LLM inference will not work.")
 
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import pynvml
+    PYNVML_AVAILABLE = True
+except ImportError:
+    PYNVML_AVAILABLE = False
+
 logger = logging.getLogger("rune.assistant")
 
+# Marks the end of a generated response on a token queue
+_END_OF_RESPONSE = object()
+# Loaded models shared by all engines, keyed on (file, model type, configured gpu layers, context length).
+# Each model is stored with the lock that serializes generation on it across engines
+_LLM_CACHE = {}
+_LLM_CACHE_LOCK = threading.Lock()
+# GGUF quantizations preferred when auto-detecting the model file, best first
+QUANT_PREFERENCE = ("q4_k_m", "q5_k_m", "q8")
+# Largest share of available memory a model file may take before we warn
+MAX_MODEL_MEMORY_FRACTION = 0.7
+# Seconds between console flushes when echoing generated tokens
+ECHO_FLUSH_INTERVAL = 0.05
+# Layer count assumed when the GGUF header doesn't provide one (typical 7B model)
+DEFAULT_LAYER_COUNT = 32
+# Free VRAM kept out of layer offloading for the CUDA context, KV cache and scratch
+# buffers: a fixed reserve plus a share of what is left
+VRAM_RESERVE_BYTES = 512 << 20
+VRAM_USABLE_FRACTION = 0.85
+# GGUF metadata value types: byte sizes of fixed-size types and struct formats of integers
+_GGUF_STRING, _GGUF_ARRAY = 8, 9
+_GGUF_SCALAR_SIZES = {0: 1, 1: 1, 2: 2, 3: 2, 4: 4, 5: 4, 6: 4, 7: 1, 10: 8, 11: 8, 12: 8}
+_GGUF_INT_FORMATS = {0: "<B", 1: "<b", 2: "<H", 3: "<h", 4: "<I", 5: "<i", 10: "<Q", 11: "<q"}
+# Read size used when priming the page cache with the model file
+PREFETCH_CHUNK = 2 << 20
+
+def _prefetch(path, stop):
+    """Read a model file into the page cache ahead of the loader, until stop is set"""
+    try:
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            buf = bytearray(PREFETCH_CHUNK)
+            while not stop.is_set() and f.readinto(buf):
+                pass
+    except OSError as e:
+        logger.warning(f"Failed to prefetch model file {path}: {e}")
+
+def _free_vram():
+    """Free memory on the first CUDA device in bytes, 0 if there is none"""
+    if not PYNVML_AVAILABLE:
+        return 0
+    try:
+        pynvml.nvmlInit()
+        try:
+            return pynvml.nvmlDeviceGetMemoryInfo(pynvml.nvmlDeviceGetHandleByIndex(0)).free
+        finally:
+            pynvml.nvmlShutdown()
+    except Exception:
+        return 0
+
+def _gguf_block_count(path):
+    """Read the number of transformer layers from a GGUF file header, None if unavailable"""
+    try:
+        with open(path, "rb") as f:
+            def read(fmt):
+                return struct.unpack(fmt, f.read(struct.calcsize(fmt)))[0]
+            
+            def skip(value_type):
+                if value_type == _GGUF_STRING:
+                    f.seek(read("<Q"), os.SEEK_CUR)
+                elif value_type == _GGUF_ARRAY:
+                    item_type, count = read("<I"), read("<Q")
+                    if item_type in _GGUF_SCALAR_SIZES:
+                        f.seek(count * _GGUF_SCALAR_SIZES[item_type], os.SEEK_CUR)
+                    else:
+                        for _ in range(count):
+                            skip(item_type)
+                else:
+                    f.seek(_GGUF_SCALAR_SIZES[value_type], os.SEEK_CUR)
+            
+            # Only GGUF v2+ (64-bit counts) is supported
+            if f.read(4) != b"GGUF" or read("<I") < 2:
+                return None
+            read("<Q") # Tensor count
+            for _ in range(read("<Q")):
+                key = f.read(read("<Q"))
+                value_type = read("<I")
+                if key.endswith(b".block_count") and value_type in _GGUF_INT_FORMATS:
+                    return read(_GGUF_INT_FORMATS[value_type])
+                skip(value_type)
+    except (OSError, struct.error, KeyError):
+        pass
+    return None
+
+def _quant_rank(filename, preference):
+    """Rank a GGUF filename by its position in the quantization preference"""
+    name = filename.lower()
+    for rank, quant in enumerate(preference):
+        if quant in name:
+            return rank
+    return len(preference)
+
 class AssistantEngine:
     """Core AI assistant engine that processes queries and generates responses"""
     
-    def __init__(self, config):
-        """Initialize assistant engine with configuration"""
+    # Canned responses used when the model is unavailable
+    _HELLO = "Hello! I'm Rune, your offline AI assistant. How can I help you today?"
+    _MORSE = "I can interpret and generate Morse code. Would you like me to convert a message to Morse?"
+    _DEFAULT = "I'm an offline AI assistant running locally on this device. I'm here to help you with information and tasks while maintaining your privacy."
+    # Simple prompt formatting - adjust as needed for your model
+    _PROMPT = "User: {query}\nAssistant:"
+    
+    def __init__(self, config, executor=None):
+        """Initialize assistant engine with configuration, running background work on executor if given"""
         self.config = config["assistant"]
+        self._executor = executor
         
         # Get model configuration
         self.model_path = Path(self.config.get("model_path", "models/llm"))
@@ -27,13 +149,30 @@ class AssistantEngine:
         self.llm_model_name = self.config.get("llm_model_name", "mistral_7b")
         # Optional: Get specific model file if specified
         self.llm_model_file = self.config.get("llm_model_file") 
+        # Optional: Quantization to prefer when auto-detecting the model file (e.g. q4_k_m)
+        self.llm_quant = self.config.get("llm_quant")
+        # Layers to offload to the GPU (0 for CPU only), or "auto" to size from free VRAM
+        self.gpu_layers = self.config.get("gpu_layers", "auto")
         
-        # Initialize the local AI model
+        # The model is loaded and run by a dedicated worker thread so neither
+        # loading nor generation blocks the caller
         self.model: AutoModelForCausalLM | None = None # Type hint for the loaded model object
-        self.init_model()
+        self._model_lock = threading.Lock() # Replaced by the cache's lock when the model is shared
+        self._model_ready = threading.Event()
+        self._requests = queue.Queue()
+        self._cancel_generation = None # Set to abort the most recent generation request
+        self._stop_prefetch = threading.Event()
+        self._spawn(self._run)
         
         logger.info(f"AssistantEngine initialized for {self.model_type} / {self.llm_model_name} at {self.model_path}")
     
+    def _spawn(self, target, *args):
+        """Run target(*args) in the background, on the shared executor when there is one"""
+        if self._executor is not None:
+            self._executor.submit(target, *args)
+        else:
+            threading.Thread(target=target, args=args, name="rune-assistant", daemon=True).start()
+    
     def init_model(self):
         """Initialize the AI model based on configuration"""
         if self.model_type != "local_llm":
@@ -56,14 +195,17 @@ class AssistantEngine:
         # Determine model file if not specified explicitly in config
         model_file_to_load = self.llm_model_file
         if not model_file_to_load:
-             # Try to find a common GGUF file in the directory
-             gguf_files = list(self.model_path.glob("*.gguf"))
+             # Try to find a GGUF file in the directory, preferring smaller quantizations
+             preference = QUANT_PREFERENCE
+             if self.llm_quant:
+                 preference = (self.llm_quant.lower(),) + preference
+             gguf_files = sorted(self.model_path.glob("*.gguf"), key=lambda f: (_quant_rank(f.name, preference), f.name))
              if len(gguf_files) == 1:
                  model_file_to_load = gguf_files[0].name
                  logger.info(f"Auto-detected model file: {model_file_to_load}")
              elif len(gguf_files) > 1:
-                 logger.warning(f"Multiple .gguf files found in {self.model_path}. Specify 'llm_model_file' in config. Using the first one: {gguf_files[0].name}")
                  model_file_to_load = gguf_files[0].name
+                 logger.info(f"Multiple .gguf files found in {self.model_path}. Using {model_file_to_load} based on quantization preference {preference}")
              else:
                  logger.error(f"No .gguf model file found in {self.model_path} and 'llm_model_file' not specified in config.")
                  return
@@ -74,19 +216,136 @@ class AssistantEngine:
             ct_model_type = "llama"
         # Add more mappings if needed (e.g., gemma, phi)
         
+        context_length = 4096 # Example context length
+        
+        model_file_path = self.model_path / model_file_to_load
+        
+        # Reuse a model already loaded by another engine with the same settings,
+        # holding the lock until the model is cached so engines starting
+        # together load it once. Keyed on the configured gpu_layers: "auto"
+        # resolves to fewer layers once a loaded model occupies VRAM, which
+        # would load a second copy
+        with _LLM_CACHE_LOCK:
+            cache_key = (str(model_file_path.resolve()), ct_model_type, self.gpu_layers, context_length)
+            cached = _LLM_CACHE.get(cache_key)
+            if cached is not None:
+                self.model, self._model_lock = cached
+                logger.info("Using cached ctransformers LLM model.")
+                return
+            
+            gpu_layers = self.gpu_layers
+            if gpu_layers == "auto":
+                gpu_layers = self._auto_gpu_layers(model_file_path)
+            if PSUTIL_AVAILABLE and model_file_path.is_file():
+                model_size = model_file_path.stat().st_size
+                available = psutil.virtual_memory().available
+                if model_size > available * MAX_MODEL_MEMORY_FRACTION:
+                    logger.warning(f"Model file {model_file_to_load} ({model_size / 2**30:.1f} GiB) is large compared to available memory ({available / 2**30:.1f} GiB). Consider a smaller quantization such as Q4_K_M.")
+            
+            # Start pulling the weights into the page cache while the loader starts up.
+            # Reading the whole file takes long, so it runs on a daemon thread off the
+            # shared pool (never holding up exit) and stops at cleanup()
+            threading.Thread(target=_prefetch, args=(model_file_path, self._stop_prefetch),
+                             name="rune-prefetch", daemon=True).start()
+            
+            try:
+                self.model = AutoModelForCausalLM.from_pretrained(
+                    str(self.model_path), 
+                    model_file=model_file_to_load, 
+                    model_type=ct_model_type, 
+                    gpu_layers=gpu_layers,
+                    context_length=context_length,
+                    threads=os.cpu_count(),
+                    batch_size=512
+                )
+                _LLM_CACHE[cache_key] = (self.model, self._model_lock)
+                logger.info("ctransformers LLM model loaded successfully.")
+            except Exception as e:
+                logger.error(f"Failed to load ctransformers LLM model: {e}")
+                self.model = None
+    
+    def _auto_gpu_layers(self, model_file_path):
+        """Number of layers that fit into free GPU memory"""
+        free = _free_vram()
+        if not free:
+            logger.info("No GPU memory available, running the LLM on the CPU (gpu_layers=0)")
+            return 0
+        
+        n_layers = _gguf_block_count(model_file_path) or DEFAULT_LAYER_COUNT
+        try:
+            bytes_per_layer = model_file_path.stat().st_size / n_layers
+        except OSError:
+            return 0
+        usable = max(0, (free - VRAM_RESERVE_BYTES) * VRAM_USABLE_FRACTION)
+        gpu_layers = min(n_layers, int(usable // bytes_per_layer)) if bytes_per_layer else 0
+        logger.info(f"{free / 2**30:.1f} GiB of free GPU memory, offloading {gpu_layers}/{n_layers} layers (gpu_layers={gpu_layers})")
+        return gpu_layers
+    
+    @classmethod
+    def clear_cache(cls):
+        """Drop all cached models so their memory (including VRAM) is released"""
+        with _LLM_CACHE_LOCK:
+            while _LLM_CACHE:
+                _, (model, _) = _LLM_CACHE.popitem()
+                del model
+        gc.collect()
+    
+    def _run(self):
+        """Worker thread: load the model, then serve generation requests"""
+        try:
+            self.init_model()
+        finally:
+            self._model_ready.set()
+        
+        while True:
+            request = self._requests.get()
+            if request is None:
+                break
+            prompt, emit, cancelled = request
+            try:
+                # TODO: Make generation parameters (max_new_tokens, temp, etc.) configurable
+                # A cached model is shared with other engines' workers, and its
+                # context is not thread-safe
+                with self._model_lock:
+                    for token in self.model(prompt, stream=True, max_new_tokens=256, temperature=0.7, top_p=0.9):
+                        if cancelled.is_set():
+                            break
+                        emit(token)
+            except Exception as e:
+                emit(e)
+            finally:
+                emit(_END_OF_RESPONSE)
+    
+    def _generate(self, prompt):
+        """Yield tokens generated by the worker thread for prompt"""
+        tokens = queue.Queue()
+        cancelled = threading.Event()
+        self._cancel_generation = cancelled
+        self._requests.put((prompt, tokens.put, cancelled))
         try:
-            # TODO: Make gpu_layers configurable
-            self.model = AutoModelForCausalLM.from_pretrained(
-                str(self.model_path), 
-                model_file=model_file_to_load, 
-                model_type=ct_model_type, 
-                gpu_layers=50, # Number of layers to offload to GPU (0 for CPU only) - ADJUST AS NEEDED
-                context_length=4096 # Example context length
-            )
-            logger.info("ctransformers LLM model loaded successfully.")
-        except Exception as e:
-            logger.error(f"Failed to load ctransformers LLM model: {e}")
-            self.model = None
+            while (token := tokens.get()) is not _END_OF_RESPONSE:
+                if isinstance(token, Exception):
+                    raise token
+                yield token
+        finally:
+            # Also stops the worker when the consumer closes or drops us early
+            cancelled.set()
+    
+    async def process_async(self, query):
+        """
+        Process a user query without blocking the event loop
+        
+        Args:
+            query: Text query from user
+            
+        Yields:
+            Response text tokens
+        """
+        # Same responses as process_stream (fallbacks and DEBUG echo included),
+        # with each blocking wait for a token moved off the event loop
+        tokens = self.process_stream(query)
+        while (token := await asyncio.to_thread(next, tokens, _END_OF_RESPONSE)) is not _END_OF_RESPONSE:
+            yield token
     
     def process(self, query):
         """
@@ -98,39 +357,93 @@ class AssistantEngine:
         Returns:
             Assistant response text
         """
+        response_text = "".join(self.process_stream(query)).strip()
+        logger.info(f"Generated response: {response_text}")
+        return response_text
+    
+    def process_stream(self, query):
+        """
+        Process a user query, yielding the response as it is generated
+        
+        Args:
+            query: Text query from user
+            
+        Yields:
+            Response text tokens
+        """
         logger.info(f"Processing query: {query}")
         
+        self._model_ready.wait()
         if self.model:
             logger.info(f"Generating response using loaded model: {self.llm_model_name}")
+            generated = False
             try:
-                # TODO: Make generation parameters (max_new_tokens, temp, etc.) configurable
-                # Simple prompt formatting - adjust as needed for your model
-                prompt = f"User: {query}\nAssistant:"
-                response_text = ""
+                prompt = self._PROMPT.format(query=query)
                 # Stream response for better perceived performance
-                stream = self.model(prompt, stream=True, max_new_tokens=256, temperature=0.7, top_p=0.9)
-                for token in stream:
-                    print(token, end="", flush=True) # Print to console during generation
-                    response_text += token
-                print() # Newline after streaming
-                
-                logger.info(f"Generated response: {response_text}")
-                return response_text.strip()
+                tokens = self._generate(prompt)
+                if logger.isEnabledFor(logging.DEBUG):
+                    tokens = self._echo(tokens)
+                for token in tokens:
+                    generated = True
+                    yield token
+                return
                 
             except Exception as e:
                 logger.error(f"Error during LLM inference: {e}")
-                # Fallback to simple response if inference fails
+                # Fallback to simple response if inference fails before producing output
+                if generated:
+                    return
         else:
             logger.warning("Cannot process query: Model not loaded.")
 
-        # Simple keyword-based responses for demo if model not loaded/inference fails
-        if "hello" in query.lower() or "hi" in query.lower():
-            return "Hello! I'm Rune, your offline AI assistant. How can I help you today?"
-        elif "time" in query.lower():
-            import datetime
-            now = datetime.datetime.now()
-            return f"The current time is {now.strftime('%H:%M')}."
-        elif "morse" in query.lower():
-            return "I can interpret and generate Morse code. Would you like me to convert a message to Morse?"
-        else:
-            return "I'm an offline AI assistant running locally on this device. I'm here to help you with information and tasks while maintaining your privacy." 
\ No newline at end of file
+        yield self._fallback_response(query)
+    
+    def _echo(self, tokens):
+        """Print tokens to the console as they pass through, flushing periodically"""
+        last_flush = time.monotonic()
+        for token in tokens:
+            sys.stdout.write(token)
+            now = time.monotonic()
+            if now - last_flush > ECHO_FLUSH_INTERVAL:
+                sys.stdout.flush()
+                last_flush = now
+            yield token
+        sys.stdout.write("\n") # Newline after streaming
+        sys.stdout.flush()
+    
+    def _fallback_response(self, query):
+        """Simple keyword-based responses for demo if model not loaded/inference fails"""
+        match = self._KEYWORD_RE.search(query)
+        if match:
+            return self._KEYWORD_HANDLERS[match.group(1).lower()](self)
+        return self._DEFAULT
+    
+    def _say_hello(self):
+        """Fallback response to a greeting"""
+        return self._HELLO
+    
+    def _say_time(self):
+        """Fallback response with the current time"""
+        now = datetime.datetime.now()
+        return f"The current time is {now.strftime('%H:%M')}."
+    
+    def _say_morse(self):
+        """Fallback response about morse code"""
+        return self._MORSE
+    
+    # Keywords recognised by the fallback responses, matched in a single pass
+    _KEYWORD_RE = re.compile(r"\b(hello|hi|time|morse)\b", re.IGNORECASE)
+    _KEYWORD_HANDLERS = {"hello": _say_hello, "hi": _say_hello, "time": _say_time, "morse": _say_morse}
+    
+    def stop(self):
+        """Abort the response currently being generated"""
+        cancelled = self._cancel_generation
+        if cancelled is not None:
+            cancelled.set()
+    
+    def cleanup(self):
+        """Clean up resources"""
+        logger.info("Cleaning up AssistantEngine resources")
+        self._stop_prefetch.set()
+        # Stop the worker thread once any running generation completes
+        self._requests.put(None)
\ No newline at end of file
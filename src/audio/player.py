@@ -1,13 +1,15 @@
 """
 Audio playback and speech synthesis module
 """
+import asyncio
+import functools
 import logging
+import queue
+from fractions import Fraction
 import numpy as np
 import sounddevice as sd
+from scipy import signal
 from pathlib import Path
-import os
-import wave # For Piper output
-import io # For Piper output
 
 try:
     from piper.voice import PiperVoice
@@ -18,6 +20,27 @@ except ImportError:
 
 logger = logging.getLogger("rune.audio.player")
 
+# Frames per chunk handed to the output stream callback
+CHUNK_FRAMES = 4096
+# Maximum number of chunks buffered ahead of the output stream
+QUEUE_CHUNKS = 32
+# Scale factor from Piper's int16 PCM to float32 in [-1.0, 1.0)
+INT16_SCALE = np.float32(1.0 / 32768.0)
+# Largest int16 sample value, used to quantize float audio for the output stream
+INT16_MAX = 32767
+# Token endings at which streamed text is handed to the TTS model
+PHRASE_ENDINGS = ('.', '!', '?', ',', ';', ':', '\n')
+
+@functools.lru_cache(maxsize=None)
+def _resample_taps(up, down):
+    """Anti-aliasing FIR taps for resample_poly, designed once per rate ratio"""
+    max_rate = max(up, down)
+    return signal.firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+
+def _to_int16(audio):
+    """Quantize float audio in [-1.0, 1.0] to int16 PCM"""
+    return np.clip(audio * INT16_MAX, -INT16_MAX - 1, INT16_MAX).astype(np.int16)
+
 class AudioPlayer:
     """Handles audio playback and text-to-speech synthesis"""
     
@@ -36,14 +59,62 @@ class AudioPlayer:
         else:
             self.voice_model_config_path = Path(self.voice_model_config_path)
             
+        self.morse_config = config.get("morse", {})
+        self.morse_frequency = self.morse_config.get("frequency", 800)
+        self.dot_duration = self.morse_config.get("dot_duration", 0.1)
+            
         self.playing = False
         self.tts_model: PiperVoice | None = None # Type hint for loaded TTS model
+        self._tts_resample = None # (up, down) ratio when the TTS rate differs from the output
+        
+        # Playback state shared with the output stream callback
+        self._queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self._pending = None # PCM bytes currently being consumed by the callback (owned by it)
+        self._offset = 0
+        self._drop_pending = False # Set by _drain() so the callback discards _pending itself
+        self._loop = None
+        self._done = None
+        self._stream = None
+        self._stream_channels = self.channels
+        self.init_stream()
+        
+        # Pre-render the morse tones once; play_morse only copies them
+        self.init_morse_tones()
         
         # Initialize the local text-to-speech model
         self.init_tts()
         
         logger.info(f"AudioPlayer initialized with sample rate {self.sample_rate} and TTS type '{self.voice_model_type}'")
     
+    def init_stream(self):
+        """Open and start the output stream fed by the playback queue"""
+        device = self.audio_config.get("output_device")
+        
+        # All of our audio is mono; let the driver mirror it when it can so
+        # we don't have to upmix every buffer ourselves
+        self._stream_channels = self.channels
+        if self.channels > 1:
+            try:
+                sd.check_output_settings(device=device, channels=1, dtype='int16', samplerate=self.sample_rate)
+                self._stream_channels = 1
+            except Exception:
+                logger.info(f"Output device does not accept mono audio, upmixing to {self.channels} channels")
+        
+        try:
+            self._stream = sd.RawOutputStream(
+                samplerate=self.sample_rate,
+                channels=self._stream_channels,
+                dtype='int16',
+                blocksize=0,
+                device=device,
+                callback=self._callback
+            )
+            # Kept running for the player's lifetime; the callback plays silence when idle
+            self._stream.start()
+        except Exception as e:
+            logger.error(f"Failed to open audio output stream: {e}")
+            self._stream = None
+    
     def init_tts(self):
         """Initialize the text-to-speech model based on configuration"""
         if self.voice_model_type != "piper":
@@ -65,96 +136,255 @@ class AudioPlayer:
             
         try:
             self.tts_model = PiperVoice.load(str(self.voice_model_path), config_path=str(self.voice_model_config_path))
-            # Check if model sample rate matches config, warn if not
-            # Note: Piper typically dictates its output sample rate.
-            # We might need to resample if it doesn't match sounddevice needs, but let's assume they match for now.
+            # Note: Piper dictates its output sample rate, resample if it doesn't match the output stream
+            tts_rate = self.tts_model.config.sample_rate
+            if tts_rate != self.sample_rate:
+                ratio = Fraction(self.sample_rate, tts_rate).limit_denominator(1000)
+                self._tts_resample = (ratio.numerator, ratio.denominator)
+                logger.info(f"TTS output rate ({tts_rate}Hz) differs from config ({self.sample_rate}Hz). Resampling by {ratio}.")
             logger.info("Piper TTS model loaded successfully.")
         except Exception as e:
             logger.error(f"Failed to load Piper TTS model: {e}")
             self.tts_model = None
     
+    def init_morse_tones(self):
+        """Pre-compute the dot, dash and gap buffers used by play_morse"""
+        dot_frames = int(self.dot_duration * self.sample_rate)
+        t = np.arange(3 * dot_frames) / self.sample_rate
+        dash = np.sin(2 * np.pi * self.morse_frequency * t).astype(np.float32)
+        dot = dash[:dot_frames].copy()
+        
+        # 5 ms raised-cosine fade in/out to avoid clicks at tone edges
+        fade_frames = min(int(0.005 * self.sample_rate), dot_frames // 2)
+        if fade_frames > 0:
+            ramp = (0.5 - 0.5 * np.cos(np.pi * np.arange(fade_frames) / fade_frames)).astype(np.float32)
+            for tone in (dot, dash):
+                tone[:fade_frames] *= ramp
+                tone[-fade_frames:] *= ramp[::-1]
+        
+        # Quantized once, the output stream plays int16 PCM directly
+        self._dot = _to_int16(dot).reshape(-1, 1)
+        self._dash = _to_int16(dash).reshape(-1, 1)
+        self._gap = np.zeros_like(self._dot)
+        self._morse_segments = {'.': self._dot, '-': self._dash, ' ': self._gap}
+        self._morse_lengths = {symbol: len(segment) for symbol, segment in self._morse_segments.items()}
+    
     def speak(self, text):
         """
-        Convert text to speech and play it
+        Convert text to speech and play it, blocking until playback completes
+        
+        Args:
+            text: Text to be spoken
+        """
+        asyncio.run(self.speak_async(text))
+    
+    async def speak_async(self, text):
+        """
+        Convert text to speech and play it without blocking the event loop
         
         Args:
             text: Text to be spoken
         """
         logger.info(f"Converting text to speech: {text}")
         
-        audio_data = None
         if self.tts_model:
             logger.info(f"Synthesizing speech using loaded TTS model: {self.voice_model_type}")
             try:
-                # Synthesize to a WAV in memory
-                with io.BytesIO() as wav_io:
-                    self.tts_model.synthesize(text, wav_io)
-                    wav_io.seek(0)
-                    # Read the WAV data from memory
-                    with wave.open(wav_io, 'rb') as wav_file:
-                        n_channels = wav_file.getnchannels()
-                        sampwidth = wav_file.getsampwidth()
-                        framerate = wav_file.getframerate()
-                        n_frames = wav_file.getnframes()
-                        wav_bytes = wav_file.readframes(n_frames)
-                        
-                        # Convert bytes to numpy array
-                        if sampwidth == 1:
-                            dtype = np.uint8
-                        elif sampwidth == 2:
-                            dtype = np.int16
-                        else:
-                            raise ValueError("Unsupported sample width")
-                            
-                        audio_np = np.frombuffer(wav_bytes, dtype=dtype)
-                        
-                        # Normalize to float32 between -1.0 and 1.0 for sounddevice
-                        if dtype == np.uint8:
-                            audio_np = (audio_np.astype(np.float32) - 128) / 128.0
-                        else:
-                            audio_np = audio_np.astype(np.float32) / np.iinfo(dtype).max
-                        
-                        # Ensure correct number of channels (Piper is likely mono)
-                        if n_channels == 1 and self.channels == 2:
-                             audio_np = np.column_stack((audio_np, audio_np))
-                        elif n_channels == 2 and self.channels == 1:
-                             audio_np = audio_np.mean(axis=1)
-                        # TODO: Handle resampling if framerate != self.sample_rate
-                        if framerate != self.sample_rate:
-                            logger.warning(f"TTS output rate ({framerate}Hz) differs from config ({self.sample_rate}Hz). Playback might be incorrect. Resampling not implemented.")
-                        
-                        audio_data = audio_np
-                        logger.info("Speech synthesized successfully.")
-                        
+                # Audio is played while the rest of the text is still being synthesized
+                await self._play_async(self._synthesize, text)
+                logger.info("Speech synthesized successfully.")
+                return
             except Exception as e:
                logger.error(f"Error during Piper TTS synthesis: {e}")
         else:
             logger.warning("Cannot synthesize speech: TTS Model not loaded.")
 
-        if audio_data is not None:
-             self.play(audio_data)
-        else:
-             logger.error("Speech synthesis failed, cannot play audio.")
-             # Fallback: Play 1 second of silence
-             logger.info("Playing silence as fallback.")
-             self.play(np.zeros((int(self.sample_rate * 1), self.channels), dtype=np.float32))
+        logger.error("Speech synthesis failed, cannot play audio.")
+        # Fallback: Play 1 second of silence
+        logger.info("Playing silence as fallback.")
+        await self.play_async(np.zeros(int(self.sample_rate * 1), dtype=np.int16))
+    
+    def speak_stream(self, tokens):
+        """
+        Speak text that arrives incrementally, starting with the first phrase
+        
+        Args:
+            tokens: Iterable of text fragments, e.g. streamed LLM tokens
+        """
+        asyncio.run(self.speak_stream_async(tokens))
+    
+    async def speak_stream_async(self, tokens):
+        """
+        Speak text that arrives incrementally without blocking the event loop
+        
+        The tokens are consumed on a worker thread, so a blocking iterator such
+        as AssistantEngine.process_stream can be passed directly.
+        
+        Args:
+            tokens: Iterable of text fragments, e.g. streamed LLM tokens
+        """
+        if not self.tts_model:
+            await self.speak_async(await asyncio.to_thread("".join, tokens))
+            return
+        
+        try:
+            await self._play_async(self._synthesize_phrases, tokens)
+        except Exception as e:
+            logger.error(f"Error during Piper TTS synthesis: {e}")
+    
+    def _synthesize_phrases(self, tokens):
+        """Synthesize streamed text one phrase at a time"""
+        phrase = []
+        for token in tokens:
+            if not self.playing:
+                return
+            phrase.append(token)
+            if not token.rstrip(' ').endswith(PHRASE_ENDINGS):
+                continue
+            text = "".join(phrase).strip()
+            phrase.clear()
+            if text:
+                logger.info(f"Converting text to speech: {text}")
+                self._synthesize(text)
+        
+        if not self.playing:
+            return
+        text = "".join(phrase).strip()
+        if text:
+            logger.info(f"Converting text to speech: {text}")
+            self._synthesize(text)
+    
+    def _synthesize(self, text):
+        """Push Piper's raw PCM output into the playback queue as it is produced"""
+        for pcm_bytes in self.tts_model.synthesize_stream_raw(text):
+            if not self.playing:
+                return
+            pcm = np.frombuffer(pcm_bytes, dtype=np.int16)
+            if self._tts_resample:
+                up, down = self._tts_resample
+                audio = np.multiply(pcm, INT16_SCALE, dtype=np.float32)
+                self._enqueue(signal.resample_poly(audio, up, down, window=_resample_taps(up, down)))
+            else:
+                # Already in the output format, queued without conversion
+                self._enqueue(pcm)
     
     def play(self, audio_data):
         """
-        Play audio data through speaker
+        Play audio data through speaker, blocking until playback completes
         
         Args:
             audio_data: Audio data as numpy array
         """
+        asyncio.run(self.play_async(audio_data))
+    
+    async def play_async(self, audio_data):
+        """
+        Play audio data through speaker without blocking the event loop
+        
+        Args:
+            audio_data: Audio data as numpy array
+        """
+        await self._play_async(self._enqueue, audio_data)
+    
+    async def _play_async(self, feed, *args):
+        """Start the output stream and play whatever feed(*args) enqueues"""
+        if self._stream is None:
+            logger.error("Cannot play audio: output stream not available.")
+            return
+        
         logger.info("Playing audio")
+        self._drain()
         self.playing = True
+        self._loop = asyncio.get_running_loop()
+        self._done = asyncio.Event()
         
-        # Play the audio
-        sd.play(audio_data, samplerate=self.sample_rate)
-        sd.wait()
+        try:
+            await asyncio.to_thread(self._feed, feed, *args)
+        finally:
+            await self._done.wait()
+            self.playing = False
+            logger.info("Audio playback complete")
+    
+    def _feed(self, feed, *args):
+        """Run feed(*args) and then mark the end of the audio for the callback"""
+        try:
+            feed(*args)
+        finally:
+            self._queue.put(None)
+    
+    def _enqueue(self, audio_data):
+        """Queue audio as int16 PCM byte chunks for the output stream"""
+        audio_data = np.asarray(audio_data)
+        if audio_data.dtype != np.int16:
+            audio_data = _to_int16(audio_data)
+        if audio_data.ndim == 1:
+            audio_data = audio_data.reshape(-1, 1)
         
-        self.playing = False
-        logger.info("Audio playback complete")
+        # Match the stream's channel count (Piper and morse audio are mono)
+        channels = self._stream_channels
+        if audio_data.shape[1] != channels:
+            if channels == 1:
+                audio_data = audio_data.mean(axis=1, keepdims=True).astype(np.int16)
+            else:
+                audio_data = np.repeat(audio_data[:, :1], channels, axis=1)
+        
+        pcm = memoryview(np.ascontiguousarray(audio_data)).cast('B')
+        chunk_bytes = CHUNK_FRAMES * audio_data.itemsize * channels
+        for start in range(0, len(pcm), chunk_bytes):
+            if not self.playing:
+                return
+            self._queue.put(pcm[start:start + chunk_bytes])
+    
+    def _drain(self):
+        """Discard any audio still waiting in the playback queue"""
+        # The stream keeps running, so only the callback may touch _pending
+        self._drop_pending = True
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+    
+    def _callback(self, outdata, frames, time, status):
+        """Fill the output buffer from the playback queue (runs on the audio thread)"""
+        if status:
+            logger.warning(f"Audio output status: {status}")
+        
+        if self._drop_pending:
+            self._drop_pending = False
+            self._pending = None
+        
+        size = len(outdata)
+        filled = 0
+        while filled < size:
+            if self._pending is None:
+                try:
+                    chunk = self._queue.get_nowait()
+                except queue.Empty:
+                    break # Underrun - pad with silence until more audio arrives
+                if chunk is None:
+                    # End of the current audio, the stream itself keeps running
+                    self._signal_done()
+                    continue
+                self._pending, self._offset = chunk, 0
+            
+            n = min(size - filled, len(self._pending) - self._offset)
+            outdata[filled:filled + n] = self._pending[self._offset:self._offset + n]
+            filled += n
+            self._offset += n
+            if self._offset == len(self._pending):
+                self._pending = None
+        
+        if filled < size:
+            outdata[filled:] = bytes(size - filled)
+    
+    def _signal_done(self):
+        """Wake up the pending play_async call (safe to call from any thread)"""
+        if self._loop is not None and self._done is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._done.set)
+            except RuntimeError:
+                pass # Event loop already closed
     
     def play_morse(self, morse_code):
         """
@@ -165,32 +395,20 @@ class AudioPlayer:
         """
         logger.info(f"Playing morse code: {morse_code}")
         
-        # Generate audio for morse code
-        dot_duration = 0.1  # seconds
-        dash_duration = dot_duration * 3
-        pause_duration = dot_duration
+        segments = self._morse_segments
+        lengths = self._morse_lengths
         
-        audio_segments = []
+        # Size the output once, then copy the cached segments into place
+        total = sum(lengths.get(symbol, 0) for symbol in morse_code)
+        audio_data = np.empty((total, 1), dtype=np.int16)
         
+        i = 0
         for symbol in morse_code:
-            if symbol == '.':
-                # Generate dot sound
-                duration = dot_duration
-                tone = np.sin(2 * np.pi * 800 * np.arange(int(duration * self.sample_rate)) / self.sample_rate)
-                audio_segments.append(tone.reshape(-1, 1))
-            elif symbol == '-':
-                # Generate dash sound
-                duration = dash_duration
-                tone = np.sin(2 * np.pi * 800 * np.arange(int(duration * self.sample_rate)) / self.sample_rate)
-                audio_segments.append(tone.reshape(-1, 1))
-            elif symbol == ' ':
-                # Generate pause
-                duration = pause_duration
-                silence = np.zeros((int(duration * self.sample_rate), 1))
-                audio_segments.append(silence)
-        
-        # Combine all segments
-        audio_data = np.vstack(audio_segments)
+            segment = segments.get(symbol)
+            if segment is not None:
+                n = lengths[symbol]
+                audio_data[i:i + n] = segment
+                i += n
         
         # Play the morse code audio
         self.play(audio_data)
@@ -199,11 +417,16 @@ class AudioPlayer:
         """Stop any current audio playback"""
         if self.playing:
             logger.info("Stopping audio playback")
-            sd.stop()
             self.playing = False
+            self._drain()
+            self._signal_done()
     
     def cleanup(self):
         """Clean up resources"""
         logger.info("Cleaning up AudioPlayer resources")
         # Stop any ongoing playback
-        self.stop() 
\ No newline at end of file
+        self.stop()
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None 
\ No newline at end of file
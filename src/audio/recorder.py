@@ -2,12 +2,22 @@
 Audio recording and voice transcription module
 """
 import logging
+import threading
+import time
 import numpy as np
 import sounddevice as sd
-from pathlib import Path
 
 logger = logging.getLogger("rune.audio.recorder")
 
+# Longest recording kept in the capture ring buffer, in seconds
+MAX_RECORD_SECONDS = 30
+# Recording length for callers without a push-to-talk button to end it
+DEFAULT_RECORD_SECONDS = 5
+# Frames delivered per input stream callback
+BLOCK_FRAMES = 1024
+# How often stream() hands over newly captured audio, in seconds
+STREAM_CHUNK_SECONDS = 0.1
+
 class AudioRecorder:
     """Records audio from microphone and transcribes speech to text"""
     
@@ -18,11 +28,54 @@ class AudioRecorder:
         self.channels = config["audio"].get("channels", 1)
         self.recording = False
         
+        # Power-of-two ring buffer written by the input stream callback, holding
+        # the device's int16 PCM as-is
+        ring_frames = 1 << (self.sample_rate * MAX_RECORD_SECONDS - 1).bit_length()
+        self._ring = np.empty((ring_frames, self.channels), dtype=np.int16)
+        self._mask = ring_frames - 1
+        self._head = 0 # Total frames captured in the current recording
+        self._stop_event = threading.Event()
+        
+        # Keep the input stream open so recording starts without device setup
+        self._stream = None
+        self.init_stream()
+        
         # Initialize the local speech recognition model
         self.init_speech_recognition()
         
         logger.info(f"AudioRecorder initialized with sample rate {self.sample_rate}")
     
+    def init_stream(self):
+        """Open the input stream that feeds the capture ring buffer"""
+        try:
+            self._stream = sd.InputStream(
+                samplerate=self.sample_rate,
+                channels=self.channels,
+                dtype='int16',
+                blocksize=BLOCK_FRAMES,
+                device=self.config["audio"].get("input_device"),
+                callback=self._on_audio
+            )
+            self._stream.start()
+        except Exception as e:
+            logger.error(f"Failed to open audio input stream: {e}")
+            self._stream = None
+    
+    def _on_audio(self, indata, frames, time, status):
+        """Copy captured audio into the ring buffer (runs on the audio thread)"""
+        if status:
+            logger.warning(f"Audio input status: {status}")
+        if not self.recording:
+            return
+        
+        start = self._head & self._mask
+        n = min(frames, len(self._ring) - start)
+        self._ring[start:start + n] = indata[:n]
+        if n < frames:
+            # Wrap around to the beginning of the ring
+            self._ring[:frames - n] = indata[n:]
+        self._head += frames
+    
     def init_speech_recognition(self):
         """Initialize the speech recognition model"""
         # TODO: Load the appropriate offline STT model
@@ -33,34 +86,89 @@ class AudioRecorder:
         Record audio from microphone
         
         Args:
-            duration: Duration in seconds to record, or None to use button control
+            duration: Duration in seconds to record, or None to record until
+                stop_recording() (at most MAX_RECORD_SECONDS)
             
         Returns:
-            Audio data as numpy array
+            Audio data as int16 numpy array
         """
         logger.info("Starting audio recording")
+        if self._stream is None:
+            logger.error("Cannot record audio: input stream not available.")
+            return np.zeros((0, self.channels), dtype=np.int16)
+        
+        self._head = 0
+        self._stop_event.clear()
         self.recording = True
         
-        # In a button-controlled setup, this would be triggered by the button
-        # and stopped when the button is released
-        
-        if duration:
-            # Fixed duration recording
-            frames = int(duration * self.sample_rate)
-            audio_data = sd.rec(frames, samplerate=self.sample_rate, channels=self.channels)
-            sd.wait()
-        else:
-            # This is a simplified version - actual implementation would use
-            # the button interface to control recording duration
-            frames = int(5 * self.sample_rate)  # Default to 5 seconds
-            audio_data = sd.rec(frames, samplerate=self.sample_rate, channels=self.channels)
-            sd.wait()
+        # In a button-controlled setup, stop_recording() is called when the
+        # button is released; otherwise stop after the requested duration
+        if not self._stop_event.wait(timeout=duration or MAX_RECORD_SECONDS) and duration is None:
+            logger.warning(f"Recording reached the {MAX_RECORD_SECONDS} s limit before the button was released")
         
         self.recording = False
+        audio_data = self._captured()
         logger.info("Audio recording complete")
         
         return audio_data
     
+    def stream(self, duration=None):
+        """
+        Record audio from microphone, yielding it while it is being captured
+        
+        Args:
+            duration: Duration in seconds to record, or None to record until
+                stop_recording() (at most MAX_RECORD_SECONDS)
+            
+        Yields:
+            int16 numpy arrays with the audio captured since the previous chunk,
+            roughly every STREAM_CHUNK_SECONDS
+        """
+        logger.info("Starting audio recording")
+        if self._stream is None:
+            logger.error("Cannot record audio: input stream not available.")
+            return
+        
+        self._head = 0
+        self._stop_event.clear()
+        self.recording = True
+        deadline = time.monotonic() + (duration or MAX_RECORD_SECONDS)
+        
+        read = 0
+        try:
+            while self.recording:
+                remaining = deadline - time.monotonic()
+                stopped = self._stop_event.wait(timeout=max(0, min(STREAM_CHUNK_SECONDS, remaining)))
+                if stopped or remaining <= STREAM_CHUNK_SECONDS:
+                    # Hand over what the stream captured up to now, then finish
+                    self.recording = False
+                    if not stopped and duration is None:
+                        logger.warning(f"Recording reached the {MAX_RECORD_SECONDS} s limit before the button was released")
+                head = self._head
+                if head > read:
+                    yield self._slice(read, head)
+                    read = head
+        finally:
+            self.recording = False
+        logger.info("Audio recording complete")
+    
+    def stop_recording(self):
+        """End the recording in progress, making record() return"""
+        self._stop_event.set()
+    
+    def _captured(self):
+        """Return a copy of the audio captured by the last recording, oldest first"""
+        return self._slice(0, self._head)
+    
+    def _slice(self, start, end):
+        """Return a copy of captured frames [start, end), oldest first"""
+        # Frames older than the ring's capacity have been overwritten, keep the most recent part
+        start = max(start, end - len(self._ring))
+        first = start & self._mask
+        if first + (end - start) <= len(self._ring):
+            return self._ring[first:first + end - start].copy()
+        return np.concatenate((self._ring[first:], self._ring[:end & self._mask]))
+    
     def transcribe(self, audio_data):
         """
         Transcribe audio data to text using local model
@@ -83,5 +191,7 @@ class AudioRecorder:
         """Clean up resources"""
         logger.info("Cleaning up AudioRecorder resources")
         # Stop any ongoing recording
-        if self.recording:
-            sd.stop() 
\ No newline at end of file
+        self.stop_recording()
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None 
\ No newline at end of file
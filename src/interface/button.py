@@ -2,46 +2,81 @@
 Button interface module for Rune
 """
 import logging
-import time
+import os
+import select
 import threading
+try:
+    import gpiod
+    GPIOD_AVAILABLE = True
+except ImportError:
+    GPIOD_AVAILABLE = False
 try:
     import RPi.GPIO as GPIO
     GPIO_AVAILABLE = True
 except ImportError:
     GPIO_AVAILABLE = False
-    logging.warning("RPi.GPIO not available - button interface will be simulated")
+    if not GPIOD_AVAILABLE:
+        logging.warning("Neither gpiod nor RPi.GPIO available - button interface will be simulated")
 
 logger = logging.getLogger("rune.interface.button")
 
+# How long the line must stay quiet after an edge before its level is trusted;
+# contact bounce produces bursts of edges well inside this window
+DEBOUNCE_SECONDS = 0.02
+
 class ButtonInterface:
     """Handles the push-to-talk button interface"""
     
-    def __init__(self, config):
-        """Initialize button interface with configuration"""
+    def __init__(self, config, executor=None):
+        """Initialize button interface with configuration, monitoring on executor if given"""
         self.config = config
         
         # Default GPIO pin for the push-to-talk button
         self.ptt_pin = config.get("ptt_pin", 17)
+        # GPIO character device holding the push-to-talk line
+        self.gpio_chip = config.get("gpio_chip", "gpiochip0")
+        
+        # Edge events from the GPIO character device, when gpiod is available
+        self._chip = None
+        self._line = None
+        self._epoll = None
+        self._wake_fds = None # Pipe used by cleanup() to wake the epoll wait
+        
+        # RPi.GPIO polling, bound once setup succeeds
+        self._gpio_input = None
+        self._gpio_low = None
         
         # Set up GPIO
         self.setup_gpio()
         
-        # Button press callback
+        # Button press and release callbacks
         self.press_callback = None
+        self.release_callback = None
         
         # Button state
         self.pressed = False
         
-        # Start monitoring thread
-        self.running = True
-        self.monitor_thread = threading.Thread(target=self.monitor_button)
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
+        # Start monitoring, on the shared executor when there is one
+        self._stop_event = threading.Event()
+        if executor is not None:
+            self._monitor_future = executor.submit(self.monitor_button)
+        else:
+            self.monitor_thread = threading.Thread(target=self.monitor_button)
+            self.monitor_thread.daemon = True
+            self.monitor_thread.start()
         
         logger.info(f"ButtonInterface initialized with PTT pin {self.ptt_pin}")
     
+    @property
+    def simulated(self):
+        """True when no GPIO backend is available, so the button is never released"""
+        return self._line is None and self._gpio_input is None
+    
     def setup_gpio(self):
         """Set up GPIO for button interface"""
+        if GPIOD_AVAILABLE and self.setup_line_events():
+            return
+        
         if not GPIO_AVAILABLE:
             logger.info("Running in simulation mode - GPIO not available")
             return
@@ -53,12 +88,42 @@ class ButtonInterface:
             # Set up the push-to-talk button pin as input with pull-up resistor
             GPIO.setup(self.ptt_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
             
+            # Bound here so the polling loop skips the module attribute lookups
+            self._gpio_input = GPIO.input
+            self._gpio_low = GPIO.LOW
+            
             logger.info("GPIO setup complete")
         except Exception as e:
             logger.error(f"Failed to set up GPIO: {e}")
             # Fall back to keyboard input for testing when not on a Raspberry Pi
             logger.info("Falling back to keyboard input simulation")
     
+    def setup_line_events(self):
+        """
+        Request edge events for the push-to-talk line from the GPIO character device
+        
+        Returns:
+            True if line events are available, False to fall back to polling
+        """
+        try:
+            chip = gpiod.Chip(self.gpio_chip)
+            line = chip.get_line(self.ptt_pin)
+            line.request(consumer="rune", type=gpiod.LINE_REQ_EV_BOTH_EDGES,
+                         flags=gpiod.LINE_REQ_FLAG_BIAS_PULL_UP)
+            
+            # The monitor thread sleeps in epoll until an edge arrives
+            self._epoll = select.epoll()
+            self._epoll.register(line.event_get_fd(), select.EPOLLIN)
+            self._wake_fds = os.pipe()
+            self._epoll.register(self._wake_fds[0], select.EPOLLIN)
+            self._chip, self._line = chip, line
+            
+            logger.info(f"GPIO line events set up on {self.gpio_chip}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to set up GPIO line events: {e}")
+            return False
+    
     def set_press_callback(self, callback):
         """
         Set callback function for button press
@@ -69,51 +134,122 @@ class ButtonInterface:
         self.press_callback = callback
         logger.info("Button press callback registered")
     
+    def set_release_callback(self, callback):
+        """
+        Set callback function for button release
+        
+        Args:
+            callback: Function to call when button is released
+        """
+        self.release_callback = callback
+        logger.info("Button release callback registered")
+    
     def monitor_button(self):
         """Monitor button state in background thread"""
         logger.info("Starting button monitoring thread")
         
         try:
-            while self.running:
-                if GPIO_AVAILABLE:
-                    # Check if button is pressed (GPIO input is LOW when button is pressed)
-                    button_state = GPIO.input(self.ptt_pin) == GPIO.LOW
-                else:
-                    # In simulation mode, just pretend the button is pressed every 10 seconds
-                    time.sleep(10)
-                    button_state = True
-                
-                # Button press detected
-                if button_state and not self.pressed:
-                    self.pressed = True
-                    logger.info("Button pressed")
-                    
-                    # Call the registered callback
-                    if self.press_callback:
-                        try:
-                            self.press_callback()
-                        except Exception as e:
-                            logger.error(f"Error in button press callback: {e}")
-                
-                # Button release detected
-                elif not button_state and self.pressed:
-                    self.pressed = False
-                    logger.info("Button released")
-                
-                # Sleep to avoid busy-waiting
-                time.sleep(0.01)
+            if self._line is not None:
+                self.monitor_line_events()
+            else:
+                self.poll_button()
         except Exception as e:
-            logger.error(f"Error in button monitoring thread: {e}")
+            logger.error("Error in button monitoring thread: %s", e)
         
         logger.info("Button monitoring thread stopped")
     
+    def monitor_line_events(self):
+        """Wait for edge events on the push-to-talk line"""
+        try:
+            line_fd = self._line.event_get_fd()
+            while not self._stop_event.is_set():
+                # No timeout, cleanup() wakes us through the pipe
+                for fd, _ in self._epoll.poll():
+                    if fd != line_fd:
+                        continue
+                    self._line.event_read()
+                    self._settle(line_fd)
+                    if self._stop_event.is_set():
+                        break
+                    # The line is pulled LOW when the button is pressed
+                    self.update_state(self._line.get_value() == 0)
+        finally:
+            # Released here rather than in cleanup() so the fd is never closed under poll()
+            self._epoll.close()
+            os.close(self._wake_fds[0])
+            self._line.release()
+            self._chip.close()
+    
+    def _settle(self, line_fd):
+        """Discard edge events until the line has been quiet for DEBOUNCE_SECONDS"""
+        bouncing = True
+        while bouncing and not self._stop_event.is_set():
+            bouncing = False
+            for fd, _ in self._epoll.poll(DEBOUNCE_SECONDS):
+                if fd == line_fd:
+                    self._line.event_read()
+                    bouncing = True
+    
+    def poll_button(self):
+        """Poll the button state when line events are not available"""
+        gpio_input, gpio_low, pin = self._gpio_input, self._gpio_low, self.ptt_pin
+        while not self._stop_event.is_set():
+            if gpio_input is not None:
+                # Check if button is pressed (GPIO input is LOW when button is pressed)
+                button_state = gpio_input(pin) == gpio_low
+            else:
+                # In simulation mode, just pretend the button is pressed every 10 seconds
+                if self._stop_event.wait(timeout=10.0):
+                    return
+                button_state = True
+            
+            self.update_state(button_state)
+            
+            # Sleep to avoid busy-waiting, returning as soon as cleanup() is called
+            if self._stop_event.wait(timeout=0.01):
+                return
+    
+    def update_state(self, button_state):
+        """
+        Track press/release transitions and fire the press and release callbacks
+        
+        Args:
+            button_state: True if the button is currently pressed
+        """
+        # Button press detected
+        if button_state and not self.pressed:
+            self.pressed = True
+            logger.info("Button pressed")
+            
+            # Call the registered callback
+            if self.press_callback:
+                try:
+                    self.press_callback()
+                except Exception as e:
+                    logger.error("Error in button press callback: %s", e)
+        
+        # Button release detected
+        elif not button_state and self.pressed:
+            self.pressed = False
+            logger.info("Button released")
+            
+            if self.release_callback:
+                try:
+                    self.release_callback()
+                except Exception as e:
+                    logger.error("Error in button release callback: %s", e)
+    
     def cleanup(self):
         """Clean up resources"""
         logger.info("Cleaning up ButtonInterface resources")
-        self.running = False
+        self._stop_event.set()
+        if self._wake_fds is not None:
+            # The write end belongs to cleanup(), the thread closes the read end
+            os.write(self._wake_fds[1], b"\0")
+            os.close(self._wake_fds[1])
         
-        # Clean up GPIO
-        if GPIO_AVAILABLE:
+        # Clean up GPIO (line events are released by the monitoring thread)
+        if GPIO_AVAILABLE and self._line is None:
             try:
                 GPIO.cleanup(self.ptt_pin)
             except:
@@ -2,32 +2,127 @@
 Morse code interpretation and generation module
 """
 import logging
+from types import MappingProxyType
 import numpy as np
-from scipy import signal
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that leaves the function as plain Python"""
+        return lambda func: func
 
 logger = logging.getLogger("rune.morse")
 
+# Sample stride of the coarse pre-check in is_morse; odd so that common tone
+# frequencies (500 Hz, 1 kHz at 16 kHz) don't alias to the same phase every sample
+COARSE_STRIDE = 31
+
+# Longest capture the preallocated downmix buffer covers (matches the recorder's limit)
+MAX_DOWNMIX_SECONDS = 30
+
+# Morse code mapping
+_MORSE_CODE = MappingProxyType({
+    'A': '.-', 'B': '-...', 'C': '-.-.', 'D': '-..', 'E': '.', 
+    'F': '..-.', 'G': '--.', 'H': '....', 'I': '..', 'J': '.---', 
+    'K': '-.-', 'L': '.-..', 'M': '--', 'N': '-.', 'O': '---', 
+    'P': '.--.', 'Q': '--.-', 'R': '.-.', 'S': '...', 'T': '-', 
+    'U': '..-', 'V': '...-', 'W': '.--', 'X': '-..-', 'Y': '-.--', 
+    'Z': '--..', '0': '-----', '1': '.----', '2': '..---', '3': '...--', 
+    '4': '....-', '5': '.....', '6': '-....', '7': '--...', '8': '---..', 
+    '9': '----.', '.': '.-.-.-', ',': '--..--', '?': '..--..', 
+    "'": '.----.', '!': '-.-.--', '/': '-..-.', '(': '-.--.', 
+    ')': '-.--.-', '&': '.-...', ':': '---...', ';': '-.-.-.', 
+    '=': '-...-', '+': '.-.-.', '-': '-....-', '_': '..--.-', 
+    '"': '.-..-.', '$': '...-..-', '@': '.--.-.'
+})
+
+# Reverse mapping for decoding
+_REVERSE_MORSE = MappingProxyType({v: k for k, v in _MORSE_CODE.items()})
+
+class _TranslationTable(dict):
+    """str.translate table that deletes characters it has no entry for"""
+    
+    def __missing__(self, key):
+        return None
+
+# Each character maps to its code plus the character space; a space adds two
+# more so that words end up separated by three spaces
+_TEXT_TO_MORSE = _TranslationTable({ord(char): code + " " for char, code in _MORSE_CODE.items()})
+_TEXT_TO_MORSE[ord(" ")] = "  "
+
+# The same table as fixed-width byte rows indexed by ASCII code (NUL padded,
+# all-NUL for characters without a code) for encoding long texts with numpy
+_TEXT_TO_MORSE_LUT = np.zeros((128, 8), dtype=np.uint8)
+for _code_point, _code in _TEXT_TO_MORSE.items():
+    _TEXT_TO_MORSE_LUT[_code_point, :len(_code)] = np.frombuffer(_code.encode("ascii"), dtype=np.uint8)
+del _code_point, _code
+_TEXT_TO_MORSE_LUT.flags.writeable = False
+
+# Texts at least this long are encoded through the lookup table; below it the
+# fixed numpy overhead outweighs str.translate
+_LUT_MIN_LENGTH = 128
+
+@njit(cache=True, fastmath=True)
+def _envelope_rle(x, threshold, hold):
+    """
+    Run-length encode the keyed/unkeyed state of a tone in a single pass
+    
+    A sample above the threshold (either polarity) keys the tone on; it only
+    drops again once no sample has crossed the threshold for more than `hold`
+    samples, which bridges the zero crossings of the carrier.
+    
+    Args:
+        x: Mono audio samples
+        threshold: Amplitude that keys the tone on
+        hold: Samples the tone stays keyed after the last loud sample
+        
+    Returns:
+        Tuple of (levels, lengths) arrays, one entry per run
+    """
+    n = x.shape[0]
+    # Every on/off pair spans more than `hold` samples, which bounds the run count
+    size = 2 * (n // (hold + 1)) + 3
+    levels = np.empty(size, np.bool_)
+    lengths = np.empty(size, np.int64)
+    k = 0
+    start = 0
+    on = False
+    last = 0
+    for i in range(n):
+        sample = x[i]
+        if sample > threshold or -sample > threshold:
+            if not on:
+                if i > start:
+                    levels[k] = False
+                    lengths[k] = i - start
+                    k += 1
+                on = True
+                start = i
+            last = i
+        elif on and i - last > hold:
+            levels[k] = True
+            lengths[k] = last + 1 - start
+            k += 1
+            on = False
+            start = last + 1
+    if n > start:
+        levels[k] = on
+        lengths[k] = n - start
+        k += 1
+    return levels[:k], lengths[:k]
+
 class MorseInterpreter:
     """Interprets and generates Morse code"""
     
-    # Morse code mapping
-    MORSE_CODE = {
-        'A': '.-', 'B': '-...', 'C': '-.-.', 'D': '-..', 'E': '.', 
-        'F': '..-.', 'G': '--.', 'H': '....', 'I': '..', 'J': '.---', 
-        'K': '-.-', 'L': '.-..', 'M': '--', 'N': '-.', 'O': '---', 
-        'P': '.--.', 'Q': '--.-', 'R': '.-.', 'S': '...', 'T': '-', 
-        'U': '..-', 'V': '...-', 'W': '.--', 'X': '-..-', 'Y': '-.--', 
-        'Z': '--..', '0': '-----', '1': '.----', '2': '..---', '3': '...--', 
-        '4': '....-', '5': '.....', '6': '-....', '7': '--...', '8': '---..', 
-        '9': '----.', '.': '.-.-.-', ',': '--..--', '?': '..--..', 
-        "'": '.----.', '!': '-.-.--', '/': '-..-.', '(': '-.--.', 
-        ')': '-.--.-', '&': '.-...', ':': '---...', ';': '-.-.-.', 
-        '=': '-...-', '+': '.-.-.', '-': '-....-', '_': '..--.-', 
-        '"': '.-..-.', '$': '...-..-', '@': '.--.-.'
-    }
+    # Morse code mapping (read-only views of the module-level tables)
+    MORSE_CODE = _MORSE_CODE
     
     # Reverse mapping for decoding
-    REVERSE_MORSE = {v: k for k, v in MORSE_CODE.items()}
+    REVERSE_MORSE = _REVERSE_MORSE
     
     def __init__(self, config):
         """Initialize morse interpreter with configuration"""
@@ -35,9 +130,19 @@ class MorseInterpreter:
         self.sample_rate = config["audio"].get("sample_rate", 16000)
         
         # Configuration for morse detection
-        self.dot_duration = 0.1  # seconds
+        self.dot_duration = config.get("morse", {}).get("dot_duration", 0.1)  # seconds
         self.dash_duration = self.dot_duration * 3
         self.threshold = 0.5  # amplitude threshold for detecting signals
+        # The same threshold for int16 PCM, so captures are compared without conversion
+        self._thr_i16 = int(self.threshold * 32767)
+        # Amplitude below which input counts as background silence
+        self.signal_floor = 0.05
+        # Keep the envelope up across carrier zero crossings (5 ms)
+        self.hold_samples = max(1, int(0.005 * self.sample_rate))
+        
+        # Scratch buffer for downmixing multi-channel captures without allocating,
+        # created by the first multi-channel call (mono input never needs it)
+        self._mono_buf = None
         
         logger.info("MorseInterpreter initialized")
     
@@ -46,7 +151,7 @@ class MorseInterpreter:
         Check if audio data contains morse code patterns
         
         Args:
-            audio_data: Audio data as numpy array
+            audio_data: Audio data as numpy array (float in [-1, 1] or int16)
             
         Returns:
             Boolean indicating if audio contains morse patterns
@@ -54,19 +159,95 @@ class MorseInterpreter:
         # Simplified detection logic - actual implementation would be more sophisticated
         # This looks for regular patterns of similar duration sounds with pauses
         
+        threshold = self._threshold_for(audio_data)
+        
         # Convert to mono if needed
-        if audio_data.ndim > 1:
-            audio_data = audio_data.mean(axis=1)
+        audio_data = self._downmix(audio_data)
         
-        # Get the amplitude envelope
-        envelope = np.abs(audio_data)
+        if audio_data.size == 0:
+            return False
         
-        # Detect peaks (simple threshold-based approach)
-        peaks = envelope > self.threshold
+        # Reject quiet input from every COARSE_STRIDE-th sample before scanning it all
+        coarse = audio_data[::COARSE_STRIDE]
+        if coarse.max() < threshold * 0.5 and coarse.min() > -threshold * 0.5:
+            return False
         
-        # Check for morse-like patterns
+        # Detect peaks (simple threshold-based approach) with two reductions
+        # over the signal instead of materializing its absolute value
         # This is a very simplified approach
-        return np.any(peaks)
+        return bool(audio_data.max() > threshold or audio_data.min() < -threshold)
+    
+    def has_signal(self, audio_data):
+        """
+        Check if audio data holds anything louder than background silence
+        
+        Args:
+            audio_data: Audio data as numpy array (float in [-1, 1] or int16)
+            
+        Returns:
+            Boolean indicating if any sample exceeds the signal floor
+        """
+        if audio_data.size == 0:
+            return False
+        floor = self.signal_floor * 32767 if audio_data.dtype == np.int16 else self.signal_floor
+        return bool(audio_data.max() > floor or audio_data.min() < -floor)
+    
+    def detect_stream(self, chunks, last_was_morse=False):
+        """
+        Check audio for morse code while its chunks are still arriving
+        
+        Chunks are checked as they arrive until one contains morse. Users tend
+        to stick to one kind of input, so when the previous input was not morse
+        and the first chunk already holds sound without morse, it is taken as
+        speech again and later chunks are only collected. A silent first chunk
+        settles nothing, as keying usually starts a moment after the press.
+        
+        Args:
+            chunks: Iterable of audio chunks, e.g. from AudioRecorder.stream()
+            last_was_morse: Whether the previous input was morse code
+            
+        Returns:
+            Tuple of (list of the chunks, whether they contain morse code)
+        """
+        collected = []
+        morse = False
+        decided = False
+        for chunk in chunks:
+            collected.append(chunk)
+            if decided:
+                continue
+            morse = self.is_morse(chunk)
+            decided = morse or (len(collected) == 1 and not last_was_morse and self.has_signal(chunk))
+        return collected, morse
+    
+    def _threshold_for(self, audio_data):
+        """Return the detection threshold in the scale of the audio's sample type"""
+        return self._thr_i16 if audio_data.dtype == np.int16 else self.threshold
+    
+    def _downmix(self, audio_data):
+        """
+        Average multi-channel audio down to mono
+        
+        The result is a view of a per-instance scratch buffer and is only valid
+        until the next call; captures longer than the buffer fall back to a
+        fresh array.
+        
+        Args:
+            audio_data: Audio data as numpy array
+            
+        Returns:
+            Mono audio data
+        """
+        if audio_data.ndim == 1:
+            return audio_data
+        if audio_data.shape[1] == 1:
+            return audio_data[:, 0]
+        if self._mono_buf is None:
+            self._mono_buf = np.empty(self.sample_rate * MAX_DOWNMIX_SECONDS, dtype=np.float32)
+        n = audio_data.shape[0]
+        if n > self._mono_buf.shape[0]:
+            return audio_data.mean(axis=1, dtype=np.float32)
+        return np.mean(audio_data, axis=1, out=self._mono_buf[:n])
     
     def decode(self, audio_data):
         """
@@ -80,12 +261,27 @@ class MorseInterpreter:
         """
         logger.info("Decoding morse from audio")
         
-        # TODO: Implement actual morse decoding
-        # This would analyze timing of sounds and silences to identify dots and dashes
+        threshold = self._threshold_for(audio_data)
+        audio_data = self._downmix(audio_data)
         
-        # For this example, we'll just return a placeholder
-        morse_string = "... --- ..."  # SOS
-        return self.morse_to_text(morse_string)
+        if audio_data.size == 0:
+            return ""
+        
+        levels, lengths = _envelope_rle(np.ascontiguousarray(audio_data), threshold, self.hold_samples)
+        
+        # Classify each run against the dot length: tones shorter than two dots
+        # are dots, longer ones dashes; silences under two dots separate symbols,
+        # under five dots characters, and anything longer words
+        dot = self.dot_duration * self.sample_rate
+        symbols = []
+        for level, length in zip(levels.tolist(), lengths.tolist()):
+            units = length / dot
+            if level:
+                symbols.append("." if units < 2 else "-")
+            elif symbols and units >= 2:
+                symbols.append(" " if units < 5 else "   ")
+        
+        return self.morse_to_text("".join(symbols).strip())
     
     def morse_to_text(self, morse_string):
         """
@@ -97,17 +293,10 @@ class MorseInterpreter:
         Returns:
             Decoded text
         """
-        words = morse_string.split("   ")
-        text = []
-        
-        for word in words:
-            chars = word.split(" ")
-            for char in chars:
-                if char in self.REVERSE_MORSE:
-                    text.append(self.REVERSE_MORSE[char])
-            text.append(" ")
-        
-        return "".join(text).strip()
+        # Words are separated by three spaces, characters by one; unknown codes are skipped
+        get = _REVERSE_MORSE.get
+        return " ".join("".join(get(char, "") for char in word.split(" "))
+                        for word in morse_string.split("   ")).strip()
     
     def text_to_morse(self, text):
         """
@@ -119,12 +308,11 @@ class MorseInterpreter:
         Returns:
             Morse code string (dots and dashes)
         """
-        morse = []
-        for char in text.upper():
-            if char == ' ':
-                morse.append("   ")  # word space
-            elif char in self.MORSE_CODE:
-                morse.append(self.MORSE_CODE[char])
-                morse.append(" ")  # character space
-        
-        return "".join(morse).strip() 
\ No newline at end of file
+        text = text.upper()
+        if len(text) < _LUT_MIN_LENGTH:
+            return text.translate(_TEXT_TO_MORSE).strip()
+        
+        # Gather each character's row and keep the non-padding bytes
+        codes = np.frombuffer(text.encode("ascii", "ignore"), dtype=np.uint8)
+        rows = _TEXT_TO_MORSE_LUT[codes].ravel()
+        return rows[rows != 0].tobytes().decode("ascii").strip()
\ No newline at end of file
@@ -3,15 +3,36 @@
 Rune - Main application entry point
 """
 import os
-import sys
+import json
 import logging
 import argparse
+import asyncio
 import signal
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 import yaml
 
+# Prefer the libyaml-backed loader, it is much faster than the pure-Python one
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import uvloop
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
 # Import modules
-from audio.recorder import AudioRecorder
+from audio.recorder import AudioRecorder, DEFAULT_RECORD_SECONDS
 from audio.player import AudioPlayer
 from morse.interpreter import MorseInterpreter
 from assistant.engine import AssistantEngine
@@ -20,29 +41,43 @@ from interface.button import ButtonInterface
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("rune")
 
+# Threads shared by all components; the button monitor and the assistant worker
+# each hold one for the application's lifetime
+THREAD_POOL_WORKERS = (os.cpu_count() or 2) + 2
+
+def json_loads(data):
+    """Parse JSON bytes, using orjson when available"""
+    return orjson.loads(data) if ORJSON_AVAILABLE else json.loads(data)
+
+def json_dumps(obj):
+    """Serialize to JSON bytes, using orjson when available"""
+    return orjson.dumps(obj) if ORJSON_AVAILABLE else json.dumps(obj).encode()
+
 class Rune:
     """Main Rune assistant application class"""
     
+    # Configuration sections merged key by key over the defaults
+    _CONFIG_SECTIONS = ("audio", "assistant", "morse")
+    
     def __init__(self, config_path=None):
         logger.info("Initializing Rune assistant...")
         
         # Set up configuration
-        self.config_path = config_path or Path("config/default.yml")
+        self.config_path = Path(config_path or "config/default.yml")
         self.load_config()
         
+        # Background work of every component runs on one shared thread pool
+        self.executor = ThreadPoolExecutor(max_workers=THREAD_POOL_WORKERS, thread_name_prefix="rune")
+        
         # Initialize components
         self.audio_recorder = AudioRecorder(self.config)
         self.audio_player = AudioPlayer(self.config)
         self.morse = MorseInterpreter(self.config)
-        self.assistant = AssistantEngine(self.config)
-        self.button = ButtonInterface(self.config)
-        
-        # Set up button callback
-        self.button.set_press_callback(self.handle_button_press)
+        self.assistant = AssistantEngine(self.config, executor=self.executor)
+        self.button = ButtonInterface(self.config, executor=self.executor)
         
-        # Register signal handlers
-        signal.signal(signal.SIGINT, self.handle_shutdown)
-        signal.signal(signal.SIGTERM, self.handle_shutdown)
+        # Whether the previous input was morse code, lets detection settle speech early
+        self._last_was_morse = False
         
         logger.info("Rune assistant initialized and ready")
     
@@ -72,19 +107,20 @@ class Rune:
         
         try:
             if self.config_path.is_file():
-                with open(self.config_path, 'r') as f:
-                    loaded_config = yaml.safe_load(f)
-                    if loaded_config:
-                        self.config = default_config.copy()
-                        for key, value in loaded_config.items():
-                            if key in self.config and isinstance(self.config[key], dict) and isinstance(value, dict):
-                                self.config[key].update(value)
-                            else:
-                                self.config[key] = value
-                        logger.info("Configuration loaded successfully.")
-                    else:
-                        logger.warning(f"Configuration file {self.config_path} is empty. Using default config.")
-                        self.config = default_config
+                loaded_config = self.read_config_file()
+                if loaded_config:
+                    # The sections are merged over their defaults, every other
+                    # key is taken from the file as-is
+                    config = {**default_config, **loaded_config}
+                    for section in self._CONFIG_SECTIONS:
+                        overrides = loaded_config.get(section)
+                        if isinstance(overrides, dict):
+                            config[section] = {**default_config[section], **overrides}
+                    self.config = config
+                    logger.info("Configuration loaded successfully.")
+                else:
+                    logger.warning(f"Configuration file {self.config_path} is empty. Using default config.")
+                    self.config = default_config
             else:
                 logger.warning(f"Configuration file {self.config_path} not found. Using default config.")
                 self.config = default_config
@@ -95,7 +131,32 @@ class Rune:
             logger.error(f"Error loading configuration: {e}. Using default config.")
             self.config = default_config
     
-    def handle_button_press(self):
+    def read_config_file(self):
+        """
+        Parse the YAML configuration file, reusing a JSON cache of it while the
+        cache is newer than the YAML file
+        
+        Returns:
+            Parsed configuration (None if the file is empty)
+        """
+        cache_path = self.config_path.with_name(self.config_path.name + ".json")
+        try:
+            if cache_path.stat().st_mtime >= self.config_path.stat().st_mtime:
+                return json_loads(cache_path.read_bytes())
+        except (OSError, ValueError):
+            pass # No usable cache, parse the YAML
+        
+        with open(self.config_path, 'r') as f:
+            loaded_config = yaml.load(f, Loader=YamlLoader)
+        
+        try:
+            cache_path.write_bytes(json_dumps(loaded_config))
+        except (OSError, TypeError) as e:
+            logger.debug(f"Could not write configuration cache {cache_path}: {e}")
+        
+        return loaded_config
+    
+    async def handle_button_press(self):
         """Handle push-to-talk button press"""
         logger.info("Button pressed - starting interaction")
         
@@ -103,47 +164,112 @@ class Rune:
         self.audio_player.stop()
         
         # Listen for input
-        audio_data = self.audio_recorder.record()
+        audio_data, morse = await asyncio.to_thread(self.capture_input)
         
         # Check if input is morse code
-        if self.morse.is_morse(audio_data):
-            text = self.morse.decode(audio_data)
+        if morse:
+            text = await asyncio.to_thread(self.morse.decode, audio_data)
         else:
             # Process speech to text
-            text = self.audio_recorder.transcribe(audio_data)
+            text = await asyncio.to_thread(self.audio_recorder.transcribe, audio_data)
         
         logger.info(f"Recognized input: {text}")
         
-        # Process with assistant
-        response = self.assistant.process(text)
+        # Process with assistant, speaking the response while it is generated
+        await self.audio_player.speak_stream_async(self.assistant.process_stream(text))
+    
+    def capture_input(self):
+        """
+        Record input, checking for morse code while it is being captured
         
-        # Output response
-        logger.info(f"Assistant response: {response}")
-        self.audio_player.speak(response)
+        Returns:
+            Tuple of (audio data, whether it contains morse code)
+        """
+        chunks, morse = self.morse.detect_stream(self._recorded_chunks(), self._last_was_morse)
+        self._last_was_morse = morse
+        if not chunks:
+            return np.zeros((0, self.audio_recorder.channels), dtype=np.int16), False
+        return np.concatenate(chunks), morse
+    
+    def _recorded_chunks(self):
+        """Yield the recording as it is captured, ending it if the button is already up"""
+        # A simulated button is never released, so give its recordings a fixed length
+        duration = DEFAULT_RECORD_SECONDS if self.button.simulated else None
+        for i, chunk in enumerate(self.audio_recorder.stream(duration)):
+            if i == 0 and not self.button.pressed:
+                # Released before the recording started, too early for stop_recording()
+                self.audio_recorder.stop_recording()
+            yield chunk
     
     def run(self):
         """Run the main application loop"""
         logger.info("Starting Rune assistant")
+        if UVLOOP_AVAILABLE:
+            uvloop.install()
         try:
-            # Main event loop
-            while True:
-                # Just wait for button press callbacks
-                signal.pause()
+            asyncio.run(self._main())
         except Exception as e:
             logger.error(f"Error in main loop: {e}")
-            self.handle_shutdown(None, None)
     
-    def handle_shutdown(self, signum, frame):
+    async def _main(self):
+        """Dispatch button presses to interactions until a shutdown signal arrives"""
+        loop = asyncio.get_running_loop()
+        # asyncio.to_thread work (recording, decoding, synthesis) shares the pool too
+        loop.set_default_executor(self.executor)
+        
+        interaction = None
+        try:
+            # Button presses arrive from the button's monitor thread; shutdown
+            # signals are queued behind them as a sentinel
+            events = asyncio.Queue()
+            shutdown = object()
+            self.button.set_press_callback(lambda: loop.call_soon_threadsafe(events.put_nowait, None))
+            # Push-to-talk: releasing the button ends the recording
+            self.button.set_release_callback(self.audio_recorder.stop_recording)
+            loop.add_signal_handler(signal.SIGINT, events.put_nowait, shutdown)
+            loop.add_signal_handler(signal.SIGTERM, events.put_nowait, shutdown)
+            
+            while await events.get() is not shutdown:
+                # A new press interrupts the previous interaction
+                await self._interrupt(interaction)
+                interaction = asyncio.create_task(self._interact())
+        finally:
+            await self._interrupt(interaction)
+            # Stop the long-running pool work before asyncio.run waits for the pool
+            self.handle_shutdown()
+    
+    async def _interrupt(self, interaction):
+        """Abort an interaction's recording, generation and playback and wait for it to end"""
+        if interaction and not interaction.done():
+            self.audio_recorder.stop_recording()
+            self.assistant.stop()
+            self.audio_player.stop()
+            # Cancelling also skips the steps the interaction has not reached yet
+            interaction.cancel()
+            await asyncio.wait((interaction,))
+    
+    async def _interact(self):
+        """Run one interaction, logging failures instead of ending the loop"""
+        try:
+            await self.handle_button_press()
+        except Exception as e:
+            logger.error(f"Error handling button press: {e}")
+    
+    def handle_shutdown(self):
         """Handle graceful shutdown"""
         logger.info("Shutting down Rune assistant...")
         
-        # Clean up resources
-        self.audio_recorder.cleanup()
-        self.audio_player.cleanup()
-        self.button.cleanup()
+        # Clean up resources. Every component gets its turn even if one fails:
+        # the button monitor and assistant worker occupy pool threads that the
+        # interpreter joins at exit, and only their cleanup ends them
+        for component in (self.audio_recorder, self.audio_player, self.assistant, self.button):
+            try:
+                component.cleanup()
+            except Exception as e:
+                logger.error(f"Error cleaning up {type(component).__name__}: {e}")
+        self.executor.shutdown(wait=False)
         
         logger.info("Shutdown complete.")
-        sys.exit(0)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Rune - Offline Local AI Assistant")
@@ -0,0 +1,103 @@
+"""
+Tests for loading the Rune configuration
+"""
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+# The application modules import each other relative to src
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+try:
+    from rune import Rune
+except ImportError: # Audio dependencies (sounddevice) not installed
+    Rune = None
+
+@unittest.skipIf(Rune is None, "Rune dependencies not available")
+class TestLoadConfig(unittest.TestCase):
+    """Test case for Rune.load_config"""
+
+    def setUp(self):
+        """Set up test case"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = Path(self.tmp.name) / "config.yml"
+        self.cache_path = Path(self.tmp.name) / "config.yml.json"
+        # Only the configuration is needed, so skip starting the components
+        self.rune = Rune.__new__(Rune)
+        self.rune.config_path = self.config_path
+
+    def tearDown(self):
+        """Clean up test case"""
+        self.tmp.cleanup()
+
+    def load(self):
+        """Load the configuration and return it"""
+        self.rune.load_config()
+        return self.rune.config
+
+    def set_mtime(self, path, mtime):
+        """Set a file's modification time"""
+        os.utime(path, (mtime, mtime))
+
+    def test_cache_hit(self):
+        """Test that a JSON cache newer than the YAML is used"""
+        self.config_path.write_text("ptt_pin: 27\n")
+        self.assertEqual(self.load()["ptt_pin"], 27)
+        self.assertTrue(self.cache_path.is_file())
+
+        # Edit only the cache; it is still newer, so it wins over the YAML
+        self.cache_path.write_text('{"ptt_pin": 22}')
+        self.set_mtime(self.config_path, 1000)
+        self.set_mtime(self.cache_path, 2000)
+        self.assertEqual(self.load()["ptt_pin"], 22)
+
+    def test_cache_invalidated(self):
+        """Test that the YAML is parsed again once it is newer than the cache"""
+        self.config_path.write_text("ptt_pin: 27\n")
+        self.load()
+
+        self.config_path.write_text("ptt_pin: 5\n")
+        self.set_mtime(self.cache_path, 1000)
+        self.set_mtime(self.config_path, 2000)
+        self.assertEqual(self.load()["ptt_pin"], 5)
+
+        # The cache was rewritten from the new YAML
+        self.set_mtime(self.config_path, 1000)
+        self.assertEqual(self.load()["ptt_pin"], 5)
+
+    def test_empty_file(self):
+        """Test that an empty YAML file gives the default configuration"""
+        self.config_path.write_text("")
+        config = self.load()
+        self.assertEqual(config["ptt_pin"], 17)
+        self.assertEqual(config["audio"]["sample_rate"], 16000)
+
+        # Also when read back from the cache
+        self.assertEqual(self.load()["ptt_pin"], 17)
+
+    def test_section_overrides(self):
+        """Test merging sections over the defaults"""
+        self.config_path.write_text(
+            "audio:\n  sample_rate: 44100\n"
+            "morse: null\n"
+            "gpio_chip: gpiochip4\n"
+        )
+        config = self.load()
+        # Overridden keys change, the rest of the section keeps its defaults
+        self.assertEqual(config["audio"]["sample_rate"], 44100)
+        self.assertEqual(config["audio"]["channels"], 1)
+        # Non-dict sections and keys outside the sections are taken as-is
+        self.assertIsNone(config["morse"])
+        self.assertEqual(config["gpio_chip"], "gpiochip4")
+        self.assertEqual(config["assistant"]["model_type"], "local_llm")
+
+        # The overrides did not leak into the defaults
+        self.config_path.unlink()
+        config = self.load()
+        self.assertEqual(config["audio"]["sample_rate"], 16000)
+        self.assertEqual(config["morse"]["frequency"], 800)
+
+if __name__ == "__main__":
+    unittest.main()
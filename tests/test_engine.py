@@ -0,0 +1,94 @@
+"""
+Tests for the assistant engine helpers
+"""
+import unittest
+import sys
+import os
+import struct
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.assistant import engine
+from src.assistant.engine import AssistantEngine, _gguf_block_count
+
+def gguf_string(text):
+    """Encode a GGUF string (64-bit length followed by the bytes)"""
+    data = text.encode()
+    return struct.pack("<Q", len(data)) + data
+
+def gguf_header(metadata, version=3):
+    """Build a GGUF header holding metadata, a list of (key, type, encoded value)"""
+    header = b"GGUF" + struct.pack("<IQQ", version, 0, len(metadata))
+    for key, value_type, value in metadata:
+        header += gguf_string(key) + struct.pack("<I", value_type) + value
+    return header
+
+class TestGGUFBlockCount(unittest.TestCase):
+    """Test case for the GGUF header parser"""
+
+    def setUp(self):
+        """Set up test case"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "model.gguf"
+
+    def tearDown(self):
+        """Clean up test case"""
+        self.tmp.cleanup()
+
+    def parse(self, data):
+        """Write data as the model file and parse it"""
+        self.path.write_bytes(data)
+        return _gguf_block_count(self.path)
+
+    def test_block_count(self):
+        """Test finding the layer count behind other metadata"""
+        metadata = [
+            ("general.architecture", 8, gguf_string("llama")),
+            ("tokenizer.ggml.tokens", 9, struct.pack("<IQ", 8, 2) + gguf_string("<s>") + gguf_string("</s>")),
+            ("tokenizer.ggml.scores", 9, struct.pack("<IQ", 6, 2) + struct.pack("<2f", 0.0, -1.5)),
+            ("llama.rope.freq_base", 6, struct.pack("<f", 10000.0)),
+            ("llama.block_count", 4, struct.pack("<I", 40)),
+        ]
+        self.assertEqual(self.parse(gguf_header(metadata)), 40)
+
+        # 64-bit counts are read too
+        self.assertEqual(self.parse(gguf_header([("llama.block_count", 10, struct.pack("<Q", 32))])), 32)
+
+    def test_unsupported(self):
+        """Test files the parser cannot read"""
+        # No block count in the metadata
+        self.assertIsNone(self.parse(gguf_header([("general.architecture", 8, gguf_string("llama"))])))
+
+        # GGUF v1 (32-bit counts) and other formats
+        self.assertIsNone(self.parse(gguf_header([], version=1)))
+        self.assertIsNone(self.parse(b"ggjt" + bytes(32)))
+
+        # Truncated header
+        self.assertIsNone(self.parse(gguf_header([("llama.block_count", 4, struct.pack("<I", 40))])[:30]))
+
+    def test_auto_gpu_layers(self):
+        """Test sizing GPU offload with headroom left in VRAM"""
+        self.path.write_bytes(gguf_header([("llama.block_count", 4, struct.pack("<I", 32))]))
+        os.truncate(self.path, 32 << 27) # 4 GiB, 128 MiB per layer
+        assistant = AssistantEngine.__new__(AssistantEngine)
+
+        # Enough free memory for every layer
+        with mock.patch.object(engine, "_free_vram", return_value=16 << 30):
+            self.assertEqual(assistant._auto_gpu_layers(self.path), 32)
+
+        # A 4 GiB card must not be filled completely
+        with mock.patch.object(engine, "_free_vram", return_value=4 << 30):
+            gpu_layers = assistant._auto_gpu_layers(self.path)
+            self.assertGreater(gpu_layers, 0)
+            self.assertLess(gpu_layers * (128 << 20), (4 << 30) - engine.VRAM_RESERVE_BYTES)
+
+        # No GPU
+        with mock.patch.object(engine, "_free_vram", return_value=0):
+            self.assertEqual(assistant._auto_gpu_layers(self.path), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -36,7 +36,16 @@ class TestMorseInterpreter(unittest.TestCase):
         # Test with spaces
         self.assertEqual(self.interpreter.text_to_morse("HELLO WORLD"), 
                         ".... . .-.. .-.. ---   .-- --- .-. .-.. -..")
-    
+
+        # Characters without a morse code are skipped
+        self.assertEqual(self.interpreter.text_to_morse("S#O~S"), "... --- ...")
+        self.assertEqual(self.interpreter.text_to_morse("s#o~s " * 50),
+                        "   ".join(["... --- ..."] * 50))
+
+        # Test long text (encoded through the lookup table)
+        self.assertEqual(self.interpreter.text_to_morse("sos " * 50),
+                        "   ".join(["... --- ..."] * 50))
+
     def test_morse_to_text(self):
         """Test morse to text conversion"""
         # Test basic conversion
@@ -66,5 +75,56 @@ class TestMorseInterpreter(unittest.TestCase):
         # Empty audio should not be detected as morse
         self.assertFalse(self.interpreter.is_morse(np.zeros((100, 1))))
 
+        # int16 captures are compared against the threshold in PCM units
+        self.assertTrue(self.interpreter.is_morse((audio * 32767).astype(np.int16)))
+        self.assertFalse(self.interpreter.is_morse((audio * 8000).astype(np.int16)))
+
+    def test_detect_stream(self):
+        """Test morse detection on a recording arriving in chunks"""
+        chunk_frames = 1600  # 100 ms
+        t = np.arange(chunk_frames) / 16000
+        silence = np.zeros((chunk_frames, 1), dtype=np.int16)
+        tone = (30000 * np.sin(2 * np.pi * 800 * t)).astype(np.int16).reshape(-1, 1)
+        speech = (tone // 10).astype(np.int16)
+
+        # Keying that starts after a silent first chunk is found, even when
+        # the previous input was speech
+        chunks, morse = self.interpreter.detect_stream([silence, silence, silence, tone], last_was_morse=False)
+        self.assertTrue(morse)
+        self.assertEqual(len(chunks), 4)
+
+        # Speech in the first chunk after speech settles the input as speech
+        chunks, morse = self.interpreter.detect_stream([speech, tone], last_was_morse=False)
+        self.assertFalse(morse)
+        self.assertEqual(len(chunks), 2)
+
+        # ...but not after morse, so every chunk is checked
+        chunks, morse = self.interpreter.detect_stream([speech, tone], last_was_morse=True)
+        self.assertTrue(morse)
+
+    def test_decode(self):
+        """Test decoding keyed tones back to text"""
+        sample_rate = 16000
+        dot_frames = int(0.1 * sample_rate)
+        t = np.arange(3 * dot_frames) / sample_rate
+        tone = np.sin(2 * np.pi * 800 * t)
+
+        # Key "SO S" with standard timing: 1 unit symbol gaps, 3 between
+        # characters and 7 between words
+        segments = []
+        for symbol in self.interpreter.text_to_morse("SO S"):
+            if symbol == " ":
+                segments.append(np.zeros(2 * dot_frames))
+            else:
+                segments.append(tone[:dot_frames] if symbol == "." else tone)
+                segments.append(np.zeros(dot_frames))
+        audio = np.concatenate(segments).reshape(-1, 1)
+
+        self.assertEqual(self.interpreter.decode(audio), "SO S")
+        self.assertEqual(self.interpreter.decode((audio * 32767).astype(np.int16)), "SO S")
+
+        # Silence decodes to nothing
+        self.assertEqual(self.interpreter.decode(np.zeros((100, 1))), "")
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
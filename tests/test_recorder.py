@@ -0,0 +1,52 @@
+"""
+Tests for the audio recorder
+"""
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from src.audio.recorder import AudioRecorder
+except ImportError: # sounddevice (and its PortAudio library) not installed
+    AudioRecorder = None
+
+@unittest.skipIf(AudioRecorder is None, "sounddevice not available")
+class TestAudioRecorder(unittest.TestCase):
+    """Test case for AudioRecorder class"""
+
+    def setUp(self):
+        """Set up test case"""
+        # Only the capture ring buffer is needed, so skip opening a device
+        self.recorder = AudioRecorder.__new__(AudioRecorder)
+        self.recorder._ring = np.empty((8, 1), dtype=np.int16)
+        self.recorder._mask = 7
+        self.recorder._head = 0
+
+    def capture(self, frames):
+        """Write frames numbered from 0 into the ring as the input callback does"""
+        audio = np.arange(frames, dtype=np.int16).reshape(-1, 1)
+        for start in range(0, frames, 3):
+            block = audio[start:start + 3]
+            self.recorder._on_audio(block, len(block), None, None)
+
+    def test_slice(self):
+        """Test copying captured frames out of the ring buffer"""
+        self.recorder.recording = True
+        self.capture(6)
+        np.testing.assert_array_equal(self.recorder._slice(0, 6).ravel(), np.arange(6))
+        np.testing.assert_array_equal(self.recorder._slice(2, 5).ravel(), [2, 3, 4])
+
+        # Wrap around the end of the ring
+        self.capture(5)
+        np.testing.assert_array_equal(self.recorder._slice(6, 11).ravel(), [0, 1, 2, 3, 4])
+
+        # Frames overwritten by newer ones are dropped, keeping the most recent
+        np.testing.assert_array_equal(self.recorder._slice(0, 11).ravel(), [3, 4, 5, 0, 1, 2, 3, 4])
+        np.testing.assert_array_equal(self.recorder._captured().ravel(), [3, 4, 5, 0, 1, 2, 3, 4])
+
+if __name__ == "__main__":
+    unittest.main()